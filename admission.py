@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import IMAGE_HEIGHT, IMAGE_WIDTH, MEMORY_BUDGET_MB, MEMORY_MAX_BYPASS
+from deadline import LatencyTracker
+
+# Copies of the final image alive at once: the decoded RGB pixels, the PNG
+# bytes and the base64 text of the response, and the PNG written on save
+_COPIES = 1 + 1 + 4 / 3 + 1
+
+
+def estimate_peak_bytes(upscale_factor, height=IMAGE_HEIGHT, width=IMAGE_WIDTH):
+    """
+    Estimate the peak memory of one image job.
+
+    :param upscale_factor: Upscaling factor, 0 for none.
+    :param height: Height of the low-resolution image.
+    :param width: Width of the low-resolution image.
+    :return: Estimated bytes.
+    """
+    low_res = height * width * 3
+    scale = max(upscale_factor, 1)
+    # The low-res image is still held while the upscaled one is decoded
+    return int(low_res * _COPIES + low_res * scale * scale * _COPIES)
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux and the BSDs
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryScheduler:
+    """
+    Admit jobs while the sum of their estimated peaks fits a memory budget.
+
+    Smaller jobs may overtake a waiting one that does not fit yet, at most
+    `max_bypass` times in a row so large jobs are not starved. A job is always
+    admitted when nothing else is in flight, even if it exceeds the budget.
+
+    Admission is driven by the estimates, not live memory: the baseline is
+    the RSS sampled whenever nothing is in flight, and RSS growth while jobs
+    run is reported by `metrics()` but not fed back into admission.
+    """
+
+    def __init__(self, budget_bytes, max_bypass=MEMORY_MAX_BYPASS, rss=current_rss):
+        """
+        :param budget_bytes: Memory the process may use, baseline included.
+        :param max_bypass: Times smaller jobs may overtake the oldest waiter.
+        :param rss: Function returning the current RSS in bytes, or None when
+            it cannot be read, in which case the baseline is 0.
+        """
+        self.budget = budget_bytes
+        self.max_bypass = max_bypass
+        self._rss = rss
+        self.baseline = None
+        self.reserved = 0
+        self.in_flight = 0
+        self._waiters = deque()
+        self._bypassed = 0
+        self._waits = LatencyTracker()
+
+    def _fits(self, estimate):
+        if self.in_flight == 0:
+            # Nothing is running, so RSS is the process's true baseline
+            self.baseline = self._rss() or 0
+            return True
+        return self.baseline + self.reserved + estimate <= self.budget
+
+    def _reserve(self, estimate):
+        self.reserved += estimate
+        self.in_flight += 1
+
+    def _wake(self):
+        for waiter in list(self._waiters):
+            estimate, future = waiter
+            if future.done():
+                self._waiters.remove(waiter)
+                continue
+            head = waiter is self._waiters[0]
+            if not head and self._bypassed >= self.max_bypass:
+                break
+            if self._fits(estimate):
+                self._waiters.remove(waiter)
+                self._reserve(estimate)
+                future.set_result(None)
+                self._bypassed = 0 if head else self._bypassed + 1
+
+    async def acquire(self, estimate):
+        """Wait until a job with this estimated peak can run."""
+        if self.baseline is None:
+            self.baseline = self._rss() or 0
+        start = time.monotonic()
+        if not self._waiters and self._fits(estimate):
+            self._reserve(estimate)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiter = (estimate, future)
+            self._waiters.append(waiter)
+            # It may fit now, or be able to overtake a waiter that does not
+            self._wake()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Admitted just as we were cancelled
+                    self.release(estimate)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._wake()
+                raise
+        self._waits.record(time.monotonic() - start)
+
+    def release(self, estimate):
+        self.reserved -= estimate
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, upscale_factor, height=IMAGE_HEIGHT, width=IMAGE_WIDTH):
+        """Hold an admission for the duration of an image job."""
+        estimate = estimate_peak_bytes(upscale_factor, height, width)
+        await self.acquire(estimate)
+        try:
+            yield
+        finally:
+            self.release(estimate)
+
+    def metrics(self):
+        rss, peak = self._rss(), peak_rss()
+        return {
+            "rss_mb": None if rss is None else rss / 2**20,
+            "peak_rss_mb": None if peak is None else peak / 2**20,
+            "reserved_mb": self.reserved / 2**20,
+            "budget_mb": self.budget / 2**20,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "queue_wait_p50": self._waits.percentile(50),
+            "queue_wait_p95": self._waits.percentile(95),
+        }
+
+
+scheduler = MemoryScheduler(MEMORY_BUDGET_MB * 2**20)
@@ -1,21 +1,39 @@
-from functools import lru_cache
+import asyncio
+import logging
+import math
+from functools import lru_cache, wraps
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from langgraph.prebuilt import ToolNode
 
+from agent.router import ModelRouter
 from agent.tools import tools
+from config import (
+    IMAGE_DEADLINE,
+    LLM_TIMEOUT,
+    PROMPT_MODELS,
+    QUALITY_ACTION,
+    QUALITY_MAX_REGENERATIONS,
+    QUALITY_THRESHOLD,
+)
+from deadline import Deadline
+from image import generate_low_res_image, upscale_image
+from quality import score_image
+from utils import save_image
 
+LLM_MAX_RETRIES = 2
 
-@lru_cache(maxsize=4)
-def _get_model():
+
+@lru_cache(maxsize=32)
+def _get_model(model_name="llama3-70b-8192", timeout=LLM_TIMEOUT):
     try:
         model = ChatGroq(
-            model="llama3-70b-8192",
+            model=model_name,
             temperature=0.8,
             max_tokens=None,
-            timeout=None,
-            max_retries=2,
+            timeout=timeout,
+            max_retries=LLM_MAX_RETRIES,
         )
         model = model.bind_tools(tools)
         return model
@@ -24,14 +42,36 @@ def _get_model():
         return None
 
 
+_router = ModelRouter(PROMPT_MODELS)
+
+
+def _record_errors(node):
+    """Turn a failing image node into an error update so the batch carries on."""
+
+    @wraps(node)
+    async def wrapper(state):
+        try:
+            return await node(state)
+        except Exception as e:
+            logging.error(f"Image failed in {node.__name__}: {e}")
+            return {"error": str(e), "errors": [f"{node.__name__}: {e}"]}
+
+    return wrapper
+
+
+async def start_image(state):
+    """Start the image's own deadline once it is actually being processed."""
+    return {"deadline": Deadline(IMAGE_DEADLINE, parent=state.get("batch_deadline"))}
+
+
 # Define the function that calls the model
-def prompt_generator(state):
+@_record_errors
+async def prompt_generator(state):
     guide = state["guide"]
     theme = state["theme"]
     instructions = state["instructions"]
     request = state["request"]
-
-    model = _get_model()
+    deadline = state.get("deadline") or Deadline()
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -57,17 +97,88 @@ def prompt_generator(state):
         ]
     )
 
-    chain = prompt | model
-    response = chain.invoke(
-        {
-            "guide": guide,
-            "theme": theme,
-            "instructions": instructions,
-            "request": request,
-        }
+    async def call(model_name):
+        # Split what is left of the deadline across the client's own retries,
+        # rounded up to whole seconds so cached clients are reused.
+        timeout = deadline.timeout(cap=LLM_TIMEOUT, what="prompt generation")
+        model = _get_model(model_name, math.ceil(timeout / (LLM_MAX_RETRIES + 1)))
+        chain = prompt | model
+        return await chain.ainvoke(
+            {
+                "guide": guide,
+                "theme": theme,
+                "instructions": instructions,
+                "request": request,
+            }
+        )
+
+    model_name, response = await _router.ainvoke(call)
+    final_prompt = response.content.strip()
+    logging.info(f"Generated image prompt with {model_name}:\n{final_prompt}")
+    return {"final_prompt": final_prompt}
+
+
+@_record_errors
+async def generate(state):
+    image = await asyncio.to_thread(
+        generate_low_res_image, state["final_prompt"], deadline=state["deadline"]
+    )
+    if image is None:
+        raise ValueError("No image returned by the inference endpoint")
+    return {"image": image}
+
+
+@_record_errors
+async def quality_gate(state):
+    """Score the low-res image and reject poor ones before paying for upscaling."""
+    scores = await asyncio.to_thread(score_image, state["image"])
+    gated = QUALITY_THRESHOLD is not None and state.get("upscale_factor", 0) > 0
+    passed = not gated or scores["score"] >= QUALITY_THRESHOLD
+    regenerations = state.get("regenerations", 0)
+    scores.update(attempt=regenerations + 1, passed=passed)
+    update = {"quality_passed": passed, "quality_attempts": [scores]}
+    if passed:
+        return update
+
+    if QUALITY_ACTION == "regenerate" and regenerations < QUALITY_MAX_REGENERATIONS:
+        logging.warning(
+            f"Image scored {scores['score']:.2f} (below {QUALITY_THRESHOLD}), "
+            "regenerating..."
+        )
+        return {**update, "regenerations": regenerations + 1}
+
+    error = f"Image scored {scores['score']:.2f} (below {QUALITY_THRESHOLD})"
+    logging.warning(f"{error}, skipping it.")
+    attempts = state.get("quality_attempts", []) + [scores]
+    return {
+        **update,
+        "error": error,
+        "errors": [f"quality_gate: {error}"],
+        "quality_scores": [{"image_path": None, "attempts": attempts}],
+    }
+
+
+@_record_errors
+async def upscale(state):
+    upscale_factor = state.get("upscale_factor", 0)
+    if upscale_factor <= 0:
+        return {}
+    image = await asyncio.to_thread(
+        upscale_image, state["image"], upscale_factor, deadline=state["deadline"]
     )
-    state["final_prompt"] = response.content.strip()
-    return state
+    return {"image": image}
+
+
+@_record_errors
+async def save(state):
+    image_path = await asyncio.to_thread(save_image, state["theme"], state["image"])
+    return {
+        "final_prompts": [state["final_prompt"]],
+        "image_paths": [image_path],
+        "quality_scores": [
+            {"image_path": image_path, "attempts": state.get("quality_attempts", [])}
+        ],
+    }
 
 
 # Define the function to execute tools
@@ -0,0 +1,157 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from config import (
+    PROMPT_MAX_CHARS,
+    ROUTER_EXPLORE_EVERY,
+    ROUTER_MAX_FAILURE_RATE,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_WINDOW,
+)
+from deadline import DeadlineExceeded, LatencyTracker
+
+# Text a model adds around the prompt instead of outputting only the prompt
+_META_TEXT = re.compile(
+    r"^\s*(here('s| is| are)\b|sure[,.!]|certainly[,.!]|as an ai\b|i (cannot|can't)\b)"
+    r"|<\s*/?\s*(function|tool_call|tool)\b|\bfunction call\b|final prompt\s*:",
+    re.IGNORECASE,
+)
+
+
+def validate_prompt(response, max_chars=PROMPT_MAX_CHARS):
+    """
+    Check a model response for use as an image prompt.
+
+    :param response: Message returned by the model.
+    :param max_chars: Longest acceptable prompt.
+    :return: Reason the prompt is rejected, or None if it is fine.
+    """
+    if getattr(response, "tool_calls", None):
+        return "tool call"
+    text = response.content.strip()
+    if not text:
+        return "empty"
+    if len(text) > max_chars:
+        return f"too long ({len(text)} characters)"
+    if _META_TEXT.search(text):
+        return "meta text"
+    return None
+
+
+class ModelRouter:
+    """
+    Pick a model per call from observed latency and failure rate, escalating
+    to the next model when the output fails validation.
+    """
+
+    def __init__(
+        self,
+        models,
+        window=ROUTER_WINDOW,
+        min_samples=ROUTER_MIN_SAMPLES,
+        max_failure_rate=ROUTER_MAX_FAILURE_RATE,
+        explore_every=ROUTER_EXPLORE_EVERY,
+    ):
+        """
+        :param models: Model names in escalation order, cheapest first.
+        :param explore_every: Every this many calls, demoted models are tried
+            first so their stats refresh and a recovered model gets promoted.
+        """
+        self.models = list(models)
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.explore_every = explore_every
+        self._calls = 0
+        self._latencies = {model: LatencyTracker(window) for model in self.models}
+        self._outcomes = {model: deque(maxlen=window) for model in self.models}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, ok):
+        self._latencies[model].record(seconds)
+        with self._lock:
+            self._outcomes[model].append(ok)
+
+    def failure_rate(self, model):
+        """Recent failure rate, or None without enough samples."""
+        with self._lock:
+            outcomes = list(self._outcomes[model])
+        if len(outcomes) < self.min_samples:
+            return None
+        return outcomes.count(False) / len(outcomes)
+
+    def candidates(self):
+        """
+        Models to try, in order. Failing models are moved to the end, and a
+        model is skipped in favour of a later one that is observed to be faster.
+        Demoted models would never be tried again, so every `explore_every`
+        calls they go first.
+        """
+        with self._lock:
+            self._calls += 1
+            explore = self.explore_every and self._calls % self.explore_every == 0
+
+        healthy, failing = [], []
+        for model in self.models:
+            rate = self.failure_rate(model)
+            if rate is not None and rate > self.max_failure_rate:
+                failing.append(model)
+            else:
+                healthy.append(model)
+
+        median = {
+            model: self._latencies[model].percentile(50, min_samples=self.min_samples)
+            for model in healthy
+        }
+        ordered, slower = [], []
+        for i, model in enumerate(healthy):
+            later = [median[other] for other in healthy[i + 1 :]]
+            if median[model] is not None and any(
+                latency is not None and latency < median[model] for latency in later
+            ):
+                # A better model answers faster anyway, try it after the others
+                slower.append(model)
+                continue
+            ordered.append(model)
+        if explore:
+            return slower + failing + ordered
+        return ordered + slower + failing
+
+    async def ainvoke(self, call, validate=validate_prompt):
+        """
+        Run `call(model)` on each candidate until one passes `validate`.
+
+        If no output passes, the last non-empty one is returned rather than
+        failing the image.
+
+        :param call: Coroutine function taking a model name, returning a message.
+        :param validate: Function returning a rejection reason or None.
+        :return: Tuple of the model name and its response.
+        """
+        fallback = None
+        last_error = None
+        for model in self.candidates():
+            start = time.monotonic()
+            try:
+                response = await call(model)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                self.record(model, time.monotonic() - start, ok=False)
+                logging.warning(f"Model {model} failed: {e}")
+                last_error = e
+                continue
+
+            problem = validate(response)
+            self.record(model, time.monotonic() - start, ok=problem is None)
+            if problem is None:
+                return model, response
+            logging.warning(f"Model {model} prompt rejected ({problem}), escalating.")
+            if response.content.strip():
+                fallback = model, response
+
+        if fallback is not None:
+            return fallback
+        raise last_error or ValueError("No model produced a prompt")
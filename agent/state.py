@@ -1,7 +1,28 @@
-from typing import TypedDict
+import operator
+from typing import Annotated, TypedDict
 
+from PIL import Image
 
-class State(TypedDict):
+from deadline import Deadline
+
+
+def _keep_last(_, new):
+    return new
+
+
+class OutputState(TypedDict):
+    # The image's prompt; for a batch, the most recently generated one, while
+    # final_prompts holds the prompt of every saved image
+    final_prompt: Annotated[str, _keep_last]
+    final_prompts: Annotated[list[str], operator.add]
+    image_paths: Annotated[list[str], operator.add]
+    errors: Annotated[list[str], operator.add]
+    # One entry per image: its image_path (None if the image was rejected)
+    # and the scores of every attempt, numbered from 1
+    quality_scores: Annotated[list[dict], operator.add]
+
+
+class State(OutputState):
     guide: str
     theme: str
     instructions: str
@@ -10,8 +31,20 @@ class State(TypedDict):
     width: int
     upscale_factor: int
     examples: str
-    final_prompt: str
+    batch_deadline: Deadline
+    deadline: Deadline
+    image: Image.Image
+    quality_passed: bool
+    quality_attempts: Annotated[list[dict], operator.add]
+    regenerations: int
+    error: str
 
 
-class OutputState(TypedDict):
-    final_prompt: str
+class BatchState(OutputState):
+    guide: str
+    theme: str
+    instructions: str
+    request: str
+    upscale_factor: int
+    batch_size: int
+    deadline: Deadline
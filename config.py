@@ -376,3 +376,88 @@ When creating image prompts, consider incorporating the following key components
 - **Avoid Ambiguity:** Ensure that the prompt leaves little room for misinterpretation.
 - **Revise and Refine:** Review the prompt to eliminate unnecessary words and focus on essential details.
 """
+
+# Seconds allowed for a single image (prompt, generation and upscaling).
+IMAGE_DEADLINE = 900
+# Seconds allowed for a whole batch; None means no batch-level limit.
+BATCH_DEADLINE = None
+# Upper bound, in seconds, for one model call while generating a prompt. The
+# Groq client retries within it, so each request gets an equal share.
+LLM_TIMEOUT = 60
+# Upper bound, in seconds, for any single inference endpoint request.
+HTTP_TIMEOUT = 300
+
+# Send a duplicate generation request when the first one is slower than the
+# observed p95 latency; upscaling requests are never hedged. Extra endpoints
+# can be listed comma-separated in INFERENCE_ENDPOINT; with a single endpoint
+# the hedge reuses it.
+HEDGE_REQUESTS = False
+HEDGE_PERCENTILE = 95
+# Latency samples required before hedging kicks in.
+HEDGE_MIN_SAMPLES = 10
+
+# Seconds to keep polling a cold (scaled-to-zero) inference endpoint.
+WARMUP_TIMEOUT = 900
+# Upper bound, in seconds, for the backoff between warm-up probes.
+WARMUP_MAX_DELAY = 30
+
+# Most images of a batch processed concurrently by the workflow; within that,
+# memory admission (MEMORY_BUDGET_MB) decides how many actually run.
+MAX_CONCURRENCY = 16
+
+# Sweep mode (sweep.py): every topic in IDEAS crossed with these requests and
+# upscale factors (0 means no upscaling), SWEEP_IMAGES_PER_CELL images each.
+SWEEP_REQUESTS = [""]
+SWEEP_UPSCALE_FACTORS = [0, 2]
+SWEEP_IMAGES_PER_CELL = 1
+# Most images in flight across the whole sweep, within MEMORY_BUDGET_MB.
+SWEEP_CONCURRENCY = 16
+# Seconds allowed for a whole sweep, independent of BATCH_DEADLINE; None means
+# no limit.
+SWEEP_DEADLINE = None
+# Dollars the sweep may spend; None means no budget.
+SWEEP_BUDGET = None
+# Hourly price of the inference endpoint(s), used to estimate cost.
+ENDPOINT_COST_PER_HOUR = 4.0
+# Seconds between rewrites of images/sweep_report.json while a sweep runs.
+SWEEP_REPORT_INTERVAL = 30
+# Topics with a higher priority are scheduled first (default 0).
+SWEEP_TOPIC_PRIORITY = {}
+
+# Groq models for prompt drafting, cheapest/fastest first. A prompt that fails
+# validation (empty, too long, tool-call or meta text) escalates to the next.
+PROMPT_MODELS = ["llama3-8b-8192", "llama3-70b-8192"]
+# Longest prompt, in characters, accepted without escalating.
+PROMPT_MAX_CHARS = 2000
+# Models failing (errors or rejected prompts) more often than this are skipped.
+ROUTER_MAX_FAILURE_RATE = 0.5
+# Calls per model the router remembers, and needs before judging a model.
+ROUTER_WINDOW = 50
+ROUTER_MIN_SAMPLES = 5
+# Every this many prompts, demoted models are tried first to refresh their stats.
+ROUTER_EXPLORE_EVERY = 20
+
+# Quality gate run on the low-res image before upscaling. Images scoring below
+# QUALITY_THRESHOLD (0-1) are regenerated up to QUALITY_MAX_REGENERATIONS
+# times with QUALITY_ACTION = "regenerate", or dropped with "skip".
+# None disables the gate; scores are recorded either way. The gate is off by
+# default: the score is uncalibrated and penalises soft-focus images, so pick
+# a threshold from the recorded scores of your own images before enabling it.
+QUALITY_THRESHOLD = None
+QUALITY_ACTION = "regenerate"
+QUALITY_MAX_REGENERATIONS = 2
+# Laplacian variance at which an image counts as fully sharp.
+QUALITY_SHARPNESS_REF = 100.0
+# Optional TorchScript aesthetic model taking a 1x3x224x224 image in [0, 1]
+# and returning a score out of 10; None disables it.
+QUALITY_AESTHETIC_MODEL = None
+
+# Size of the low-resolution images generated before any upscaling.
+IMAGE_HEIGHT = 1024
+IMAGE_WIDTH = 768
+# Memory, in MB, that in-flight images may use, including the process's
+# baseline. Jobs are admitted while their estimated peaks fit.
+MEMORY_BUDGET_MB = 4096
+# Times smaller jobs may overtake the oldest waiting job before admission
+# becomes strictly first come, first served.
+MEMORY_MAX_BYPASS = 8
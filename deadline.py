@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a deadline expires before the work could complete."""
+
+
+class Deadline:
+    """A point in (monotonic) time by which some work has to be finished."""
+
+    def __init__(self, seconds=None, parent=None):
+        """
+        :param seconds: Time budget from now, or None for no limit of its own.
+        :param parent: Enclosing deadline; the earlier of the two wins.
+        """
+        expires_at = None if seconds is None else time.monotonic() + seconds
+        if parent is not None and parent.expires_at is not None:
+            if expires_at is None:
+                expires_at = parent.expires_at
+            else:
+                expires_at = min(expires_at, parent.expires_at)
+        self.expires_at = expires_at
+
+    def remaining(self):
+        """Seconds left, or None when unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, what="operation"):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+    def timeout(self, cap=None, what="operation"):
+        """
+        Timeout to hand to a blocking call.
+
+        :param cap: Upper bound applied even when the deadline is further away.
+        :param what: Description used in the error message.
+        :return: Seconds, or None if both the deadline and the cap are unbounded.
+        """
+        self.check(what)
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+
+def retry_within_deadline(exceptions=Exception, tries=3, delay=1, backoff=2):
+    """
+    Like `retry.retry`, but aware of the `deadline` keyword argument.
+
+    DeadlineExceeded is never retried, and no retry is attempted when the
+    backoff delay alone would overrun the deadline.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            deadline = kwargs.get("deadline") or Deadline()
+            attempt_delay = delay
+            for attempt in range(1, tries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except DeadlineExceeded:
+                    raise
+                except exceptions as e:
+                    remaining = deadline.remaining()
+                    if attempt == tries or (
+                        remaining is not None and remaining <= attempt_delay
+                    ):
+                        raise
+                    logging.warning(f"{e}, retrying in {attempt_delay} seconds...")
+                    time.sleep(attempt_delay)
+                    attempt_delay *= backoff
+
+        return wrapper
+
+    return decorator
+
+
+class LatencyTracker:
+    """Rolling window of observed latencies."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, q, min_samples=1):
+        """Nearest-rank percentile, or None with fewer than `min_samples` samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        rank = max(1, math.ceil(q / 100 * len(samples)))
+        return samples[rank - 1]
+
+
+async def hedged_call(attempts, hedge_after=None, deadline=None):
+    """
+    Run the first attempt and, if it is still pending after `hedge_after`
+    seconds, start the next one. The first successful result wins and the
+    remaining attempts are cancelled, which aborts their connections.
+
+    :param attempts: Coroutine functions, each sending the same request.
+    :param hedge_after: Seconds to wait before hedging, or None to never hedge.
+    :param deadline: Deadline bounding the whole call.
+    :return: Result of the winning attempt.
+    """
+    deadline = deadline or Deadline()
+    pending = {asyncio.ensure_future(attempts[0]())}
+    next_attempt = 1
+    errors = []
+    try:
+        while pending:
+            timeout = deadline.timeout(what="hedged call")
+            can_hedge = hedge_after is not None and next_attempt < len(attempts)
+            if can_hedge:
+                timeout = hedge_after if timeout is None else min(timeout, hedge_after)
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+
+            if not done and can_hedge:
+                logging.info(
+                    f"Request slower than {hedge_after:.1f}s, sending a hedged request..."
+                )
+                pending.add(asyncio.ensure_future(attempts[next_attempt]()))
+                next_attempt += 1
+
+        deadline.check("hedged call")
+        raise errors[-1]
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
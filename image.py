@@ -1,69 +1,280 @@
+import asyncio
 import base64
 import io
 import logging
 import os
+import threading
+import time
+from collections import defaultdict
 from typing import Any, Dict
 
+import httpx
 import requests
 from PIL import Image
-from retry import retry
 
+from config import (
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    HEDGE_REQUESTS,
+    HTTP_TIMEOUT,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    WARMUP_MAX_DELAY,
+    WARMUP_TIMEOUT,
+)
+from deadline import Deadline, LatencyTracker, hedged_call, retry_within_deadline
 
-@retry(Exception, delay=1, backoff=2, tries=3)
-def generate_image(image_prompt, upscale_factor=0) -> Image.Image:
-    """Generate an image from the prompt, optionally upscaling it."""
-    api_url = os.environ["INFERENCE_ENDPOINT"]
-    hf_token = os.environ["HF_TOKEN"]
-    headers = {"Authorization": f"Bearer {hf_token}"}
+# Observed request latencies, keyed by request kind ("generate", "upscale_4", ...)
+_latencies = defaultdict(LatencyTracker)
 
-    def encode_image_to_base64(image: Image.Image) -> str:
-        """
-        Encode a PIL Image to a base64 string.
 
-        :param image: PIL Image.
-        :return: Base64 encoded string of the image.
-        """
-        try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            return image_base64
-        except Exception as e:
-            logging.error(f"Failed to encode image: {e}")
-            raise
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
 
-    def decode_base64_to_image(image_base64: str) -> Image.Image:
-        """
-        Decode a base64 string to a PIL Image.
 
-        :param image_base64: Base64 encoded image string.
-        :return: PIL Image object.
-        """
+def _get_loop():
+    """
+    Return the event loop running inference requests. It lives in a daemon
+    thread and owns one httpx client, so connections are pooled across all
+    requests and a cancelled request aborts its connection.
+    """
+    global _loop, _client
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="inference-requests", daemon=True
+            ).start()
+            _client = httpx.AsyncClient()
+            _loop = loop
+        return _loop
+
+
+def get_endpoints():
+    """Return the configured inference endpoints, primary first."""
+    return [
+        url.strip()
+        for url in os.environ["INFERENCE_ENDPOINT"].split(",")
+        if url.strip()
+    ]
+
+
+def get_headers():
+    """Return the authorization headers for the inference endpoints."""
+    return {"Authorization": f"Bearer {os.environ['HF_TOKEN']}"}
+
+
+class EndpointWarmer:
+    """
+    Poll the inference endpoints in the background until they stop answering
+    with 5xx, so a scale-from-zero cold start overlaps with other work.
+    """
+
+    # Statuses returned while an endpoint is scaled to zero or initializing
+    COLD_STATUSES = {502, 503, 504}
+
+    def __init__(self, endpoints, headers):
+        self.endpoints = endpoints
+        self.headers = headers
+        # Set once the primary endpoint answers
+        self.ready = threading.Event()
+        # Set once polling has stopped, whether the endpoints came up or not
+        self.done = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="endpoint-warmup", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _probe(self, url) -> bool:
+        """Return whether the endpoint answered without a cold-start status."""
         try:
-            image_bytes = base64.b64decode(image_base64)
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            return image
-        except Exception as e:
-            logging.error(f"Failed to decode image: {e}")
-            raise
+            response = requests.get(url, headers=self.headers, timeout=10)
+        except requests.RequestException as err:
+            logging.debug(f"Warm-up probe to {url} failed: {err}")
+            return False
+        return response.status_code not in self.COLD_STATUSES
+
+    def _run(self):
+        deadline = Deadline(WARMUP_TIMEOUT)
+        cold = list(self.endpoints)
+        delay = 1
+        try:
+            while cold:
+                cold = [url for url in cold if not self._probe(url)]
+                if self.endpoints[0] not in cold and not self.ready.is_set():
+                    logging.info("Inference endpoint is ready.")
+                    self.ready.set()
+                if not cold:
+                    break
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= delay:
+                    logging.warning(
+                        f"Inference endpoints still cold after {WARMUP_TIMEOUT}s: "
+                        f"{', '.join(cold)}"
+                    )
+                    break
+                logging.info("Waiting for inference endpoint to warm up...")
+                time.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_DELAY)
+        finally:
+            self.done.set()
 
-    def query(payload: Dict[str, Any]) -> Dict[str, Any]:
+    def wait(self, deadline=None) -> bool:
         """
-        Send a POST request to the inference endpoint.
+        Block until the primary endpoint is ready or polling gives up.
 
-        :param payload: The JSON payload for the request.
-        :return: JSON response from the server.
+        :param deadline: Deadline bounding the wait.
+        :return: Whether the primary endpoint is ready.
         """
+        deadline = deadline or Deadline()
+        while not self.ready.is_set() and not self.done.is_set():
+            remaining = deadline.remaining()
+            self.done.wait(1 if remaining is None else min(1, remaining))
+            deadline.check("inference endpoint warm-up")
+        return self.ready.is_set()
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_warmup():
+    """Start warming up the inference endpoints unless already in progress."""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None or _warmer.done.is_set():
+            _warmer = EndpointWarmer(get_endpoints(), get_headers()).start()
+        return _warmer
+
+
+def wait_for_endpoint(deadline=None) -> bool:
+    """Wait for an in-progress warm-up, if any, to see the endpoint ready."""
+    warmer = _warmer
+    if warmer is None:
+        return True
+    return warmer.wait(deadline)
+
+
+def encode_image_to_base64(image: Image.Image) -> str:
+    """
+    Encode a PIL Image to a base64 string.
+
+    :param image: PIL Image.
+    :return: Base64 encoded string of the image.
+    """
+    try:
+        buffered = io.BytesIO()
+        image.save(buffered, format="PNG")
+        image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        return image_base64
+    except Exception as e:
+        logging.error(f"Failed to encode image: {e}")
+        raise
+
+
+def decode_base64_to_image(image_base64: str) -> Image.Image:
+    """
+    Decode a base64 string to a PIL Image.
+
+    :param image_base64: Base64 encoded image string.
+    :return: PIL Image object.
+    """
+    try:
+        image_bytes = base64.b64decode(image_base64)
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        return image
+    except Exception as e:
+        logging.error(f"Failed to decode image: {e}")
+        raise
+
+
+async def _post(api_url: str, payload: Dict[str, Any], deadline) -> Dict[str, Any]:
+    """
+    Send a single POST request to one inference endpoint.
+
+    :param api_url: Endpoint URL.
+    :param payload: The JSON payload for the request.
+    :param deadline: Deadline bounding the request.
+    :return: JSON response from the server.
+    """
+    timeout = deadline.timeout(cap=HTTP_TIMEOUT, what="inference request")
+    try:
+        response = await _client.post(
+            api_url, headers=get_headers(), json=payload, timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        logging.error(f"HTTP error occurred: {http_err} - {response.text}")
+        if response.status_code in EndpointWarmer.COLD_STATUSES:
+            # The endpoint scaled to zero, let the next attempt wait for it
+            start_warmup()
+        raise
+    except Exception as err:
+        logging.error(f"An error occurred: {err}")
+        raise
+
+
+def query(payload: Dict[str, Any], kind: str, deadline=None) -> Dict[str, Any]:
+    """
+    Send a POST request to the inference endpoint, hedging slow requests.
+
+    :param payload: The JSON payload for the request.
+    :param kind: Request kind, used to track latencies separately.
+    :param deadline: Deadline bounding the request, hedges included.
+    :return: JSON response from the server.
+    """
+    deadline = deadline or Deadline()
+    endpoints = get_endpoints()
+    tracker = _latencies[kind]
+    hedge_after = None
+    # Only generation is hedged: duplicating an upscale would double its large
+    # upload and response buffers, which memory admission does not account for
+    if HEDGE_REQUESTS and kind == "generate":
+        hedge_after = tracker.percentile(
+            HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES
+        )
+
+    async def primary():
+        # Track the primary's latency rather than the winner's, so hedging
+        # does not drag the p95 down and hedge ever more requests
+        start = time.monotonic()
         try:
-            response = requests.post(api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.HTTPError as http_err:
-            logging.error(f"HTTP error occurred: {http_err} - {response.text}")
-            raise
-        except Exception as err:
-            logging.error(f"An error occurred: {err}")
+            result = await _post(endpoints[0], payload, deadline)
+        except asyncio.CancelledError:
+            # Lost to the hedge: the time it ran is a lower bound
+            tracker.record(time.monotonic() - start)
             raise
+        tracker.record(time.monotonic() - start)
+        return result
+
+    async def hedge():
+        # The next endpoint, or another slot on the same one
+        return await _post(endpoints[1 % len(endpoints)], payload, deadline)
+
+    attempts = [primary, hedge] if hedge_after else [primary]
+
+    future = asyncio.run_coroutine_threadsafe(
+        hedged_call(attempts, hedge_after=hedge_after, deadline=deadline),
+        _get_loop(),
+    )
+    try:
+        result = future.result()
+    except BaseException:
+        # Also abort the requests if this thread gives up, e.g. on Ctrl+C
+        future.cancel()
+        raise
+    return result
+
+
+@retry_within_deadline(Exception, delay=1, backoff=2, tries=3)
+def generate_low_res_image(image_prompt, deadline=None) -> Image.Image:
+    """Generate a low-resolution image from the prompt."""
+    wait_for_endpoint(deadline)
 
     logging.info("Generating low-resolution image...")
     # Generate the image at lower resolution
@@ -71,14 +282,14 @@ def generate_image(image_prompt, upscale_factor=0) -> Image.Image:
         "inputs": image_prompt,
         "num_inference_steps": 50,
         "guidance_scale": 3.5,
-        "height": 1024,
-        "width": 768,
+        "height": IMAGE_HEIGHT,
+        "width": IMAGE_WIDTH,
         # Do not include 'upscale_factor' here
     }
 
     try:
         # Generate low-resolution image
-        response = query(generation_params)
+        response = query(generation_params, "generate", deadline=deadline)
         # Extract the base64 image from the response
         generated_image_b64 = response.get("image", "")
         if not generated_image_b64:
@@ -86,37 +297,44 @@ def generate_image(image_prompt, upscale_factor=0) -> Image.Image:
             return None
 
         # Decode the base64 image
-        generated_image = decode_base64_to_image(generated_image_b64)
-
-        if upscale_factor > 0:
-            # Upscale the image
-            logging.info("Upscaling image...")
-            # Encode the generated image to base64
-            control_image_b64 = encode_image_to_base64(generated_image)
-
-            # Prepare upscaling payload
-            upscaling_params = {
-                "inputs": "",  # Empty prompt as per the upscaling example
-                "control_image": control_image_b64,
-                "upscale_factor": upscale_factor,
-                "num_inference_steps": 28,
-                "guidance_scale": 3.5,
-                "controlnet_conditioning_scale": 0.6,
-                # Heights and widths are handled by the server based on the control image
-            }
-
-            # Send upscaling request
-            upscaled_response = query(upscaling_params)
-            upscaled_image_b64 = upscaled_response.get("image", "")
-            if not upscaled_image_b64:
-                logging.error("No image found in the upscaling response.")
-                return generated_image  # Return the low-res image if upscaling fails
-
-            # Decode the upscaled image
-            upscaled_image = decode_base64_to_image(upscaled_image_b64)
-            return upscaled_image
-        else:
-            return generated_image
+        return decode_base64_to_image(generated_image_b64)
     except Exception as e:
         logging.error(f"Error generating image: {e}")
         raise e
+
+
+@retry_within_deadline(Exception, delay=1, backoff=2, tries=3)
+def upscale_image(image, upscale_factor, deadline=None) -> Image.Image:
+    """Upscale an image, returning it unchanged if upscaling yields nothing."""
+    wait_for_endpoint(deadline)
+
+    logging.info("Upscaling image...")
+    # Encode the generated image to base64
+    control_image_b64 = encode_image_to_base64(image)
+
+    # Prepare upscaling payload
+    upscaling_params = {
+        "inputs": "",  # Empty prompt as per the upscaling example
+        "control_image": control_image_b64,
+        "upscale_factor": upscale_factor,
+        "num_inference_steps": 28,
+        "guidance_scale": 3.5,
+        "controlnet_conditioning_scale": 0.6,
+        # Heights and widths are handled by the server based on the control image
+    }
+
+    try:
+        # Send upscaling request
+        upscaled_response = query(
+            upscaling_params, f"upscale_{upscale_factor}", deadline=deadline
+        )
+        upscaled_image_b64 = upscaled_response.get("image", "")
+        if not upscaled_image_b64:
+            logging.error("No image found in the upscaling response.")
+            return image  # Return the low-res image if upscaling fails
+
+        # Decode the upscaled image
+        return decode_base64_to_image(upscaled_image_b64)
+    except Exception as e:
+        logging.error(f"Error upscaling image: {e}")
+        raise e
@@ -1,7 +1,11 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from config import GUIDE, IDEAS
-from image import generate_image
+from admission import scheduler
+from config import BATCH_DEADLINE, GUIDE, IDEAS, MAX_CONCURRENCY
+from deadline import Deadline
+from image import start_warmup
 from setup import (
     get_batch_size,
     get_upscale_factor,
@@ -10,13 +14,58 @@ from setup import (
     setup_logging,
     validate_api_keys,
 )
-from utils import save_image
 from workflow import get_workflow
 
+
+async def run_batch(graph, inputs, batch_size):
+    """
+    Run the whole batch in one graph invocation, logging per-image progress.
+
+    :return: Saved image paths and the quality scores of every image.
+    """
+    # Blocking requests run in threads, make sure every image can get one
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    )
+    image_paths = []
+    quality_scores = []
+    images = {}  # subgraph namespace -> image number, in order of first update
+    async for namespace, update in graph.astream(
+        inputs,
+        config={"max_concurrency": MAX_CONCURRENCY},
+        stream_mode="updates",
+        subgraphs=True,
+    ):
+        for node, values in update.items():
+            if not namespace:
+                # A whole image pipeline finished
+                image_paths.extend((values or {}).get("image_paths", []))
+                quality_scores.extend((values or {}).get("quality_scores", []))
+                continue
+            number = images.setdefault(namespace[0], len(images) + 1)
+            if values and values.get("error"):
+                logging.error(f"Image {number}/{batch_size} failed at {node}.")
+            else:
+                logging.info(f"Image {number}/{batch_size}: {node} done.")
+    for entry in quality_scores:
+        attempts = ", ".join(
+            f"#{scores['attempt']} {scores['score']:.2f}"
+            f"{'' if scores['passed'] else ' (rejected)'}"
+            for scores in entry["attempts"]
+        )
+        logging.info(
+            f"Quality of {entry['image_path'] or 'rejected image'}: {attempts}"
+        )
+    logging.info(f"Memory admission: {scheduler.metrics()}")
+    return image_paths, quality_scores
+
+
 if __name__ == "__main__":
 
     setup_logging()
     validate_api_keys()
+    # Wake scaled-to-zero endpoints while the user answers the prompts below
+    start_warmup()
 
     # Step 1: Get the topic from the user
     selected_topic = get_user_topic(IDEAS)
@@ -36,33 +85,25 @@ if __name__ == "__main__":
     # Step 6: Get agentic workflow
     graph = get_workflow()
 
-    # Step 7: Initialize list to store image paths
-    image_paths = []
-
-    # Step 8: Loop for batch_size times
-    for i in range(1, batch_size + 1):
-        logging.info(f"Processing image {i}/{batch_size}...")
-        # Invoke the workflow
-        image_prompt_data = graph.invoke(
+    # Step 7: Generate, upscale and save the whole batch concurrently, each
+    # image bounded by its own deadline and all of them by the batch deadline
+    image_paths, quality_scores = asyncio.run(
+        run_batch(
+            graph,
             {
                 "guide": GUIDE,
                 "theme": selected_topic,
                 "instructions": topic_instructions,
                 "request": user_request,
-            }
+                "upscale_factor": upscale_factor,
+                "batch_size": batch_size,
+                "deadline": Deadline(BATCH_DEADLINE),
+            },
+            batch_size,
         )
+    )
 
-        # Extract the final prompt
-        image_prompt = image_prompt_data["final_prompt"].strip()
-        logging.info(f"Generated image prompt:\n{image_prompt}")
-        # Generate the image
-        image = generate_image(image_prompt, upscale_factor)
-
-        # Save the image
-        image_path = save_image(selected_topic, image)
-        image_paths.append(image_path)
-
-    # Step 9: Log all image paths
+    # Step 8: Log all image paths
     logging.info("Batch generation completed. Image paths:")
     for path in image_paths:
         logging.info(path)
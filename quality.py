@@ -0,0 +1,91 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from config import QUALITY_AESTHETIC_MODEL, QUALITY_SHARPNESS_REF
+
+# Luma levels treated as crushed shadows or blown highlights
+_CLIP_LOW, _CLIP_HIGH = 5, 250
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian, low for blurry or flat images."""
+    laplacian = (
+        gray[:-2, 1:-1]
+        + gray[2:, 1:-1]
+        + gray[1:-1, :-2]
+        + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def entropy(gray: np.ndarray) -> float:
+    """Shannon entropy of the luma histogram, in bits (0 to 8)."""
+    histogram = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    p = histogram[histogram > 0] / gray.size
+    return float(-(p * np.log2(p)).sum())
+
+
+def clipped_fraction(gray: np.ndarray) -> float:
+    """Fraction of pixels crushed to black or blown to white."""
+    return float(((gray <= _CLIP_LOW) | (gray >= _CLIP_HIGH)).mean())
+
+
+@lru_cache(maxsize=1)
+def _get_aesthetic_model(path):
+    try:
+        import torch
+
+        model = torch.jit.load(path, map_location="cpu")
+        model.eval()
+        return model
+    except Exception as e:
+        logging.error(f"Error loading aesthetic model: {e}")
+        return None
+
+
+def aesthetic_score(image: Image.Image, path=QUALITY_AESTHETIC_MODEL):
+    """Score out of 1 from the aesthetic model, or None if it is not available."""
+    if path is None:
+        return None
+    model = _get_aesthetic_model(path)
+    if model is None:
+        return None
+
+    import torch
+
+    pixels = np.asarray(image.convert("RGB").resize((224, 224)), dtype=np.float32)
+    batch = torch.from_numpy(pixels / 255.0).permute(2, 0, 1).unsqueeze(0)
+    with torch.inference_mode():
+        score = float(model(batch).reshape(-1)[0])
+    return min(max(score / 10, 0.0), 1.0)
+
+
+def score_image(image: Image.Image) -> dict:
+    """
+    Score an image for obvious defects: blur, blank or flat content and bad
+    exposure, plus the aesthetic model when configured.
+
+    :param image: PIL Image, usually the decoded low-resolution image.
+    :return: Raw metrics and a combined "score" between 0 and 1, set by the
+        weakest component so one defect is enough to fail an image.
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    metrics = {
+        "sharpness": laplacian_variance(gray),
+        "entropy": entropy(gray),
+        "clipped": clipped_fraction(gray),
+        "aesthetic": aesthetic_score(image),
+    }
+    components = [
+        min(metrics["sharpness"] / QUALITY_SHARPNESS_REF, 1.0),
+        metrics["entropy"] / 8,
+        1.0 - metrics["clipped"],
+    ]
+    if metrics["aesthetic"] is not None:
+        components.append(metrics["aesthetic"])
+    metrics["score"] = float(min(components))
+    return metrics
@@ -5,6 +5,8 @@ import random
 
 from langchain_groq import ChatGroq
 
+from config import LLM_TIMEOUT
+
 
 def setup_logging():
     """Configure logging for the script."""
@@ -33,7 +35,7 @@ def setup_groq_llm():
         model="llama3-70b-8192",
         temperature=0.8,
         max_tokens=None,
-        timeout=None,
+        timeout=LLM_TIMEOUT,
         max_retries=2,
     )
 
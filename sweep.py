@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import scheduler
+from config import (
+    ENDPOINT_COST_PER_HOUR,
+    GUIDE,
+    IDEAS,
+    SWEEP_BUDGET,
+    SWEEP_CONCURRENCY,
+    SWEEP_DEADLINE,
+    SWEEP_IMAGES_PER_CELL,
+    SWEEP_REPORT_INTERVAL,
+    SWEEP_REQUESTS,
+    SWEEP_TOPIC_PRIORITY,
+    SWEEP_UPSCALE_FACTORS,
+)
+from deadline import Deadline
+from image import start_warmup
+from setup import setup_logging, validate_api_keys
+from sweep_plan import Budget, new_stats, plan_sweep, report_rows
+from workflow import get_image_workflow
+
+
+async def run_sweep(plan, stats, concurrency, budget, deadline=None, report_path=None):
+    """
+    Run the plan through a single compiled image workflow, updating `stats`
+    as jobs finish and rewriting the report at most every
+    SWEEP_REPORT_INTERVAL seconds.
+    """
+    # Blocking requests run in threads, make sure every job can get one
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency)
+    )
+    graph = get_image_workflow()
+    jobs = iter(plan)
+    last_report = time.monotonic()
+    in_flight = 0
+    done = 0
+
+    async def worker():
+        nonlocal in_flight, done, last_report
+        for cell in jobs:
+            async with scheduler.admit(cell.upscale_factor):
+                if deadline is not None and deadline.expired():
+                    logging.warning("Sweep deadline passed, not scheduling more jobs.")
+                    return
+                if not budget.admit(in_flight):
+                    logging.warning("Sweep budget exhausted, not scheduling more jobs.")
+                    return
+                cell_stats = stats[cell]
+                in_flight += 1
+                start = time.monotonic()
+                if cell_stats.first_start is None:
+                    cell_stats.first_start = start
+                try:
+                    result = await graph.ainvoke(
+                        {
+                            "guide": GUIDE,
+                            "theme": cell.topic,
+                            "instructions": IDEAS[cell.topic],
+                            "request": cell.request,
+                            "upscale_factor": cell.upscale_factor,
+                            "batch_deadline": deadline,
+                        }
+                    )
+                except Exception as e:
+                    logging.error(f"Sweep job {cell} failed: {e}")
+                    result = {"errors": [str(e)]}
+                end = time.monotonic()
+                in_flight -= 1
+            done += 1
+            budget.completed += 1
+            cell_stats.run += 1
+            cell_stats.job_seconds += end - start
+            cell_stats.last_end = end
+            cell_stats.image_paths.extend(result.get("image_paths", []))
+            cell_stats.quality_scores.extend(result.get("quality_scores", []))
+            cell_stats.images += len(result.get("image_paths", []))
+            cell_stats.failures += len(result.get("errors", []))
+            metrics = scheduler.metrics()
+            logging.info(
+                f"Sweep progress: {done}/{len(plan)} jobs, "
+                f"${budget.spent():.2f} spent, "
+                f"{metrics['rss_mb'] or 0:.0f}/{metrics['budget_mb']:.0f} MB RSS, "
+                f"{metrics['queued']} queued for memory."
+            )
+            if report_path and time.monotonic() - last_report >= SWEEP_REPORT_INTERVAL:
+                last_report = time.monotonic()
+                write_report(stats, budget, report_path)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def log_report(rows, total_cost):
+    """Log throughput and cost per cell."""
+    for row in rows:
+        logging.info(
+            f"{row['topic']} | {row['request'] or '-'} | "
+            f"x{row['upscale_factor'] or 1}: "
+            f"{row['images']} images, {row['failures']} failures, "
+            f"{row['not_run']} not run, "
+            f"{row['images_per_minute']:.2f} images/min, ${row['cost']:.2f}"
+        )
+    logging.info(f"Sweep finished, estimated cost ${total_cost:.2f}.")
+
+
+def write_report(stats, budget, path):
+    """
+    Write the report to `path`, replacing it atomically so an interrupted
+    sweep always leaves a complete copy behind.
+
+    :return: Report rows.
+    """
+    rows = report_rows(stats, budget)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"cells": rows, "memory": scheduler.metrics()}, f, indent=2)
+    os.replace(tmp_path, path)
+    return rows
+
+
+if __name__ == "__main__":
+
+    setup_logging()
+    validate_api_keys()
+    start_warmup()
+
+    plan = plan_sweep(
+        IDEAS,
+        SWEEP_REQUESTS,
+        SWEEP_UPSCALE_FACTORS,
+        SWEEP_IMAGES_PER_CELL,
+        priority=SWEEP_TOPIC_PRIORITY,
+    )
+    logging.info(f"Sweep planned: {len(plan)} images.")
+
+    budget = Budget(SWEEP_BUDGET, ENDPOINT_COST_PER_HOUR)
+    stats = new_stats(plan)
+    os.makedirs("images", exist_ok=True)
+    report_path = os.path.join("images", "sweep_report.json")
+    try:
+        asyncio.run(
+            run_sweep(
+                plan,
+                stats,
+                SWEEP_CONCURRENCY,
+                budget,
+                deadline=Deadline(SWEEP_DEADLINE),
+                report_path=report_path,
+            )
+        )
+    finally:
+        # Also keep what was done if the sweep crashed or was interrupted
+        log_report(write_report(stats, budget, report_path), budget.spent())
+        logging.info(f"Sweep report saved to {report_path}")
@@ -0,0 +1,112 @@
+import itertools
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Cell:
+    """One point of the sweep grid."""
+
+    topic: str
+    request: str
+    upscale_factor: int
+
+
+@dataclass
+class CellStats:
+    planned: int = 0
+    # Jobs that ran, whether they produced an image or not
+    run: int = 0
+    images: int = 0
+    failures: int = 0
+    # Sum of the time each of the cell's jobs was in flight
+    job_seconds: float = 0.0
+    first_start: float = None
+    last_end: float = None
+    image_paths: list = field(default_factory=list)
+    quality_scores: list = field(default_factory=list)
+
+
+def new_stats(plan):
+    """Empty stats for every cell of the plan."""
+    stats = {cell: CellStats() for cell in plan}
+    for cell in plan:
+        stats[cell].planned += 1
+    return stats
+
+
+def plan_sweep(topics, requests, upscale_factors, images_per_cell, priority=None):
+    """
+    Expand the grid into an ordered job plan.
+
+    :param priority: Mapping of topic to priority, higher topics come first.
+    :return: List of cells, one entry per image to generate.
+    """
+    priority = priority or {}
+    cells = [
+        Cell(topic, request, upscale_factor)
+        for topic, request, upscale_factor in itertools.product(
+            topics, requests, upscale_factors
+        )
+    ]
+    # Stable sort keeps the grid order within a priority level
+    cells.sort(key=lambda cell: -priority.get(cell.topic, 0))
+    return [cell for cell in cells for _ in range(images_per_cell)]
+
+
+class Budget:
+    """Tracks the estimated endpoint cost of a sweep against a spending limit."""
+
+    def __init__(self, limit, cost_per_hour):
+        self.limit = limit
+        self.cost_per_hour = cost_per_hour
+        self.started = time.monotonic()
+        self.completed = 0
+
+    def spent(self):
+        """The endpoint is billed for wall time, however many jobs share it."""
+        return (time.monotonic() - self.started) * self.cost_per_hour / 3600
+
+    def admit(self, in_flight):
+        """Whether one more job fits, given the mean cost of finished jobs."""
+        if self.limit is None:
+            return True
+        if not self.completed:
+            return self.spent() < self.limit
+        per_job = self.spent() / self.completed
+        return self.spent() + per_job * (in_flight + 1) <= self.limit
+
+
+def report_rows(stats, budget):
+    """Throughput and cost per cell, as a list of dicts."""
+    total_seconds = sum(cell_stats.job_seconds for cell_stats in stats.values())
+    total_cost = budget.spent()
+    rows = []
+    for cell, cell_stats in stats.items():
+        span = (
+            cell_stats.last_end - cell_stats.first_start
+            if cell_stats.last_end is not None
+            else 0.0
+        )
+        # Split the sweep's cost across cells by the time their jobs took
+        cost = (
+            total_cost * cell_stats.job_seconds / total_seconds if total_seconds else 0
+        )
+        rows.append(
+            {
+                "topic": cell.topic,
+                "request": cell.request,
+                "upscale_factor": cell.upscale_factor,
+                "images": cell_stats.images,
+                "failures": cell_stats.failures,
+                "not_run": cell_stats.planned - cell_stats.run,
+                "images_per_minute": cell_stats.images * 60 / span if span else 0.0,
+                "cost": cost,
+                "cost_per_image": (
+                    cost / cell_stats.images if cell_stats.images else None
+                ),
+                "image_paths": cell_stats.image_paths,
+                "quality_scores": cell_stats.quality_scores,
+            }
+        )
+    return rows
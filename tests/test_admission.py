@@ -0,0 +1,182 @@
+import asyncio
+import builtins
+import sys
+from types import SimpleNamespace
+
+import admission
+from admission import MemoryScheduler, current_rss, estimate_peak_bytes, peak_rss
+
+MB = 2**20
+
+
+def _scheduler(budget_mb=1000, baseline_mb=100, max_bypass=8):
+    return MemoryScheduler(
+        budget_mb * MB, max_bypass=max_bypass, rss=lambda: baseline_mb * MB
+    )
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_estimate_grows_with_upscale_factor():
+    assert estimate_peak_bytes(8) > estimate_peak_bytes(2) > estimate_peak_bytes(0)
+    assert estimate_peak_bytes(0) == estimate_peak_bytes(1)
+
+
+def test_small_jobs_overtake_waiting_large_job():
+    async def run():
+        scheduler = _scheduler()
+        await scheduler.acquire(734 * MB)
+        large = asyncio.create_task(scheduler.acquire(734 * MB))
+        await _settle()
+        small = [asyncio.create_task(scheduler.acquire(20 * MB)) for _ in range(6)]
+        await _settle()
+
+        assert all(task.done() for task in small)
+        assert not large.done()
+        assert scheduler.in_flight == 7
+
+        scheduler.release(734 * MB)
+        for _ in small:
+            scheduler.release(20 * MB)
+        await _settle()
+        assert large.done()
+
+    asyncio.run(run())
+
+
+def test_bypass_limit_stops_overtaking():
+    async def run():
+        scheduler = _scheduler(max_bypass=2)
+        await scheduler.acquire(734 * MB)
+        large = asyncio.create_task(scheduler.acquire(734 * MB))
+        await _settle()
+        small = [asyncio.create_task(scheduler.acquire(20 * MB)) for _ in range(3)]
+        await _settle()
+
+        assert [task.done() for task in small] == [True, True, False]
+
+        # Once the large job gets in, the counter resets
+        scheduler.release(734 * MB)
+        scheduler.release(20 * MB)
+        scheduler.release(20 * MB)
+        await _settle()
+        assert large.done()
+        assert small[2].done()
+
+    asyncio.run(run())
+
+
+def test_job_over_budget_runs_alone():
+    async def run():
+        scheduler = _scheduler()
+        await scheduler.acquire(5000 * MB)
+        assert scheduler.in_flight == 1
+        waiting = asyncio.create_task(scheduler.acquire(20 * MB))
+        await _settle()
+        assert not waiting.done()
+        scheduler.release(5000 * MB)
+        await _settle()
+        assert waiting.done()
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_is_dropped():
+    async def run():
+        scheduler = _scheduler(max_bypass=0)
+        await scheduler.acquire(734 * MB)
+        large = asyncio.create_task(scheduler.acquire(734 * MB))
+        small = asyncio.create_task(scheduler.acquire(20 * MB))
+        await _settle()
+        assert not small.done()
+
+        # Cancelling the head lets the job behind it in
+        large.cancel()
+        await _settle()
+        assert large.cancelled()
+        assert small.done()
+        assert scheduler.metrics()["queued"] == 0
+        assert scheduler.in_flight == 2
+
+        scheduler.release(734 * MB)
+        scheduler.release(20 * MB)
+        assert scheduler.reserved == 0
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_admit_releases_on_error():
+    async def run():
+        scheduler = _scheduler()
+        try:
+            async with scheduler.admit(8):
+                assert scheduler.in_flight == 1
+                raise ValueError
+        except ValueError:
+            pass
+        assert scheduler.in_flight == 0
+        assert scheduler.reserved == 0
+
+    asyncio.run(run())
+
+
+def test_baseline_is_resampled_when_idle():
+    rss = [100 * MB]
+    scheduler = MemoryScheduler(1000 * MB, rss=lambda: rss[0])
+
+    async def run():
+        await scheduler.acquire(10 * MB)
+        scheduler.release(10 * MB)
+        rss[0] = 900 * MB
+        await scheduler.acquire(10 * MB)
+        assert scheduler.baseline == 900 * MB
+
+    asyncio.run(run())
+
+
+def test_current_rss_reads_proc():
+    if sys.platform.startswith("linux"):
+        assert current_rss() > 0
+
+
+def test_current_rss_is_none_without_proc(monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise FileNotFoundError
+
+    monkeypatch.setattr(builtins, "open", no_proc)
+    assert current_rss() is None
+
+
+def test_peak_rss_units(monkeypatch):
+    usage = SimpleNamespace(ru_maxrss=1000)
+    fake = SimpleNamespace(RUSAGE_SELF=0, getrusage=lambda who: usage)
+    monkeypatch.setitem(sys.modules, "resource", fake)
+
+    monkeypatch.setattr(admission.sys, "platform", "darwin")
+    assert peak_rss() == 1000
+    monkeypatch.setattr(admission.sys, "platform", "linux")
+    assert peak_rss() == 1000 * 1024
+
+
+def test_peak_rss_without_resource_module(monkeypatch):
+    # The resource module does not exist on Windows
+    monkeypatch.setitem(sys.modules, "resource", None)
+    assert peak_rss() is None
+
+
+def test_unreadable_rss_means_zero_baseline():
+    scheduler = MemoryScheduler(1000 * MB, rss=lambda: None)
+
+    async def run():
+        await scheduler.acquire(600 * MB)
+        second = asyncio.create_task(scheduler.acquire(300 * MB))
+        await _settle()
+        assert second.done()
+        assert scheduler.baseline == 0
+        assert scheduler.metrics()["rss_mb"] is None
+
+    asyncio.run(run())
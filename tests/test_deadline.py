@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from deadline import (
+    Deadline,
+    DeadlineExceeded,
+    LatencyTracker,
+    hedged_call,
+    retry_within_deadline,
+)
+
+
+def _attempt(result, delay, log, name):
+    """Coroutine function returning `result` (or raising it) after `delay`."""
+
+    async def call():
+        log.append(f"{name} started")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"{name} cancelled")
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call
+
+
+def test_deadline_takes_earlier_parent():
+    parent = Deadline(1)
+    assert Deadline(10, parent=parent).expires_at == parent.expires_at
+    assert Deadline(None, parent=parent).expires_at == parent.expires_at
+    assert Deadline().remaining() is None
+
+
+def test_deadline_timeout_is_capped_and_checked():
+    assert Deadline().timeout(cap=5) == 5
+    assert Deadline(60).timeout(cap=5) == 5
+    with pytest.raises(DeadlineExceeded):
+        Deadline(0).timeout()
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker()
+    assert tracker.percentile(95) is None
+    for seconds in range(1, 101):
+        tracker.record(seconds)
+    assert tracker.percentile(95) == 95
+    assert tracker.percentile(50, min_samples=101) is None
+
+
+def test_fast_primary_wins_without_hedging():
+    log = []
+    attempts = [
+        _attempt("primary", 0, log, "primary"),
+        _attempt("hedge", 0, log, "hedge"),
+    ]
+    assert asyncio.run(hedged_call(attempts, hedge_after=0.5)) == "primary"
+    assert log == ["primary started"]
+
+
+def test_hedge_wins_and_primary_is_cancelled():
+    log = []
+    attempts = [
+        _attempt("primary", 10, log, "primary"),
+        _attempt("hedge", 0.01, log, "hedge"),
+    ]
+    assert asyncio.run(hedged_call(attempts, hedge_after=0.01)) == "hedge"
+    assert "primary cancelled" in log
+
+
+def test_primary_can_still_win_after_hedging():
+    log = []
+    attempts = [
+        _attempt("primary", 0.05, log, "primary"),
+        _attempt("hedge", 10, log, "hedge"),
+    ]
+    assert asyncio.run(hedged_call(attempts, hedge_after=0.01)) == "primary"
+    assert "hedge cancelled" in log
+
+
+def test_primary_failing_before_hedge_raises():
+    log = []
+    attempts = [
+        _attempt(ValueError("boom"), 0, log, "primary"),
+        _attempt("hedge", 0, log, "hedge"),
+    ]
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(hedged_call(attempts, hedge_after=1))
+    assert log == ["primary started"]
+
+
+def test_failed_hedge_waits_for_primary():
+    log = []
+    attempts = [
+        _attempt("primary", 0.05, log, "primary"),
+        _attempt(ValueError("boom"), 0, log, "hedge"),
+    ]
+    assert asyncio.run(hedged_call(attempts, hedge_after=0.01)) == "primary"
+
+
+def test_deadline_cancels_all_attempts():
+    log = []
+    attempts = [
+        _attempt("primary", 10, log, "primary"),
+        _attempt("hedge", 10, log, "hedge"),
+    ]
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(hedged_call(attempts, hedge_after=0.01, deadline=Deadline(0.05)))
+    assert time.monotonic() - start < 1
+    assert "primary cancelled" in log and "hedge cancelled" in log
+
+
+def test_retry_stops_at_deadline():
+    calls = []
+
+    @retry_within_deadline(ValueError, tries=5, delay=0.01, backoff=1)
+    def flaky(deadline=None):
+        calls.append(1)
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        flaky()
+    assert len(calls) == 5
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        flaky(deadline=Deadline(0.005))
+    assert len(calls) == 1
+
+
+def test_retry_does_not_retry_deadline_exceeded():
+    calls = []
+
+    @retry_within_deadline(Exception, tries=3, delay=0)
+    def expired(deadline=None):
+        calls.append(1)
+        raise DeadlineExceeded
+
+    with pytest.raises(DeadlineExceeded):
+        expired()
+    assert len(calls) == 1
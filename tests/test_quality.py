@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+from quality import clipped_fraction, entropy, laplacian_variance, score_image
+
+
+def _noise(size=(128, 96), seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(20, 236, size=(size[1], size[0], 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_laplacian_variance_of_flat_image_is_zero():
+    assert laplacian_variance(np.full((32, 32), 128.0)) == 0.0
+
+
+def test_laplacian_variance_drops_with_blur():
+    image = _noise().convert("L")
+    sharp = laplacian_variance(np.asarray(image, dtype=np.float32))
+    blurred = image.filter(ImageFilter.GaussianBlur(2))
+    assert laplacian_variance(np.asarray(blurred, dtype=np.float32)) < sharp / 10
+
+
+def test_laplacian_variance_of_single_point():
+    gray = np.zeros((3, 3), dtype=np.float32)
+    gray[1, 1] = 1.0
+    # Only the centre pixel has a full neighbourhood
+    assert laplacian_variance(gray) == 0.0
+    gray = np.zeros((5, 5), dtype=np.float32)
+    gray[2, 2] = 1.0
+    # Interior Laplacian: -4 at the centre, 1 at its four neighbours
+    values = np.array([0, 1, 0, 1, -4, 1, 0, 1, 0], dtype=np.float32)
+    assert laplacian_variance(gray) == pytest.approx(values.var())
+
+
+def test_entropy():
+    assert entropy(np.full((16, 16), 7.0)) == 0.0
+    two_levels = np.zeros((16, 16), dtype=np.float32)
+    two_levels[:8] = 255
+    assert entropy(two_levels) == pytest.approx(1.0)
+    all_levels = np.arange(256, dtype=np.float32).reshape(16, 16)
+    assert entropy(all_levels) == pytest.approx(8.0)
+
+
+def test_clipped_fraction():
+    gray = np.full((10, 10), 128.0)
+    assert clipped_fraction(gray) == 0.0
+    gray[:2] = 0
+    gray[2:3] = 255
+    assert clipped_fraction(gray) == pytest.approx(0.3)
+
+
+def test_score_image_ranks_defects_below_a_sharp_image():
+    sharp = score_image(_noise())
+    blank = score_image(Image.new("RGB", (128, 96), (128, 128, 128)))
+    blurred = score_image(_noise().filter(ImageFilter.GaussianBlur(4)))
+    black = score_image(Image.new("RGB", (128, 96)))
+
+    assert sharp["score"] > 0.9
+    assert blank["score"] == 0.0
+    assert blurred["score"] < sharp["score"]
+    assert black["clipped"] == 1.0 and black["score"] == 0.0
+    assert sharp["aesthetic"] is None
+    assert set(sharp) == {"sharpness", "entropy", "clipped", "aesthetic", "score"}
@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from agent.router import ModelRouter, validate_prompt
+
+
+def _message(content, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls or [])
+
+
+def _run(router, outputs):
+    """Route one call where each model returns `outputs[model]` (or raises it)."""
+    tried = []
+
+    async def call(model):
+        tried.append(model)
+        output = outputs[model]
+        if isinstance(output, Exception):
+            raise output
+        return _message(output)
+
+    model, response = asyncio.run(router.ainvoke(call))
+    return model, response.content, tried
+
+
+@pytest.mark.parametrize(
+    "content, reason",
+    [
+        ("A dragon over a neon city, sharp focus", None),
+        ("", "empty"),
+        ("x" * 5000, "too long (5000 characters)"),
+        ("Here is the prompt: a dragon", "meta text"),
+        ("<function=search>{}</function>", "meta text"),
+        ("Sure-footed goats on a cliff at dawn", None),
+    ],
+)
+def test_validate_prompt(content, reason):
+    assert validate_prompt(_message(content)) == reason
+
+
+def test_validate_prompt_rejects_tool_calls():
+    assert validate_prompt(_message("ok", tool_calls=[{"name": "x"}])) == "tool call"
+
+
+def test_escalates_on_invalid_output():
+    router = ModelRouter(["small", "large"])
+    model, content, tried = _run(router, {"small": "", "large": "a castle"})
+    assert (model, content, tried) == ("large", "a castle", ["small", "large"])
+
+
+def test_escalates_on_error():
+    router = ModelRouter(["small", "large"])
+    model, _, _ = _run(router, {"small": RuntimeError("down"), "large": "a castle"})
+    assert model == "large"
+
+
+def test_falls_back_to_last_non_empty_output():
+    router = ModelRouter(["small", "large"])
+    model, content, _ = _run(router, {"small": "", "large": "Here is a castle"})
+    assert (model, content) == ("large", "Here is a castle")
+
+
+def test_failing_model_is_demoted_and_explored_again():
+    router = ModelRouter(
+        ["small", "large"], min_samples=2, max_failure_rate=0.5, explore_every=5
+    )
+    for _ in range(2):
+        router.record("small", 0.1, ok=False)
+
+    orders = [router.candidates() for _ in range(5)]
+    assert orders[:4] == [["large", "small"]] * 4
+    assert orders[4] == ["small", "large"]
+
+
+def test_slower_model_is_demoted():
+    router = ModelRouter(["small", "large"], min_samples=2, explore_every=0)
+    for _ in range(2):
+        router.record("small", 2.0, ok=True)
+        router.record("large", 1.0, ok=True)
+    assert router.candidates() == ["large", "small"]
+
+
+def test_recovered_model_is_promoted_after_exploring():
+    router = ModelRouter(["small", "large"], window=2, min_samples=2, explore_every=2)
+    for _ in range(2):
+        router.record("small", 0.1, ok=False)
+    _run(router, {"small": "a castle", "large": "a castle"})  # call 1: large only
+    _run(router, {"small": "a castle", "large": "a castle"})  # call 2: explores
+    _run(router, {"small": "a castle", "large": "a castle"})
+    _run(router, {"small": "a castle", "large": "a castle"})  # explores again
+    assert router.candidates()[0] == "small"
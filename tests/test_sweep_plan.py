@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from sweep_plan import Budget, Cell, new_stats, plan_sweep, report_rows
+
+
+def test_plan_crosses_the_grid_in_order():
+    plan = plan_sweep(["a", "b"], ["", "red"], [0, 2], images_per_cell=1)
+    assert plan == [
+        Cell("a", "", 0),
+        Cell("a", "", 2),
+        Cell("a", "red", 0),
+        Cell("a", "red", 2),
+        Cell("b", "", 0),
+        Cell("b", "", 2),
+        Cell("b", "red", 0),
+        Cell("b", "red", 2),
+    ]
+
+
+def test_plan_repeats_each_cell():
+    plan = plan_sweep(["a", "b"], [""], [0], images_per_cell=3)
+    assert plan == [Cell("a", "", 0)] * 3 + [Cell("b", "", 0)] * 3
+    assert [stats.planned for stats in new_stats(plan).values()] == [3, 3]
+
+
+def test_plan_orders_topics_by_priority():
+    plan = plan_sweep(["a", "b", "c"], [""], [0, 2], 1, priority={"c": 2, "b": 1})
+    assert [cell.topic for cell in plan] == ["c", "c", "b", "b", "a", "a"]
+    # Grid order is kept within a topic
+    assert [cell.upscale_factor for cell in plan[:2]] == [0, 2]
+
+
+def _budget(limit, hours_elapsed, completed=0):
+    budget = Budget(limit, cost_per_hour=3600)  # $1 per second
+    budget.started = time.monotonic() - hours_elapsed * 3600
+    budget.completed = completed
+    return budget
+
+
+def test_budget_without_limit_always_admits():
+    assert _budget(None, hours_elapsed=1, completed=10).admit(in_flight=100)
+
+
+def test_budget_before_any_job_completes():
+    assert _budget(10, hours_elapsed=5 / 3600).admit(in_flight=3)
+    assert not _budget(10, hours_elapsed=11 / 3600).admit(in_flight=0)
+
+
+def test_budget_projects_in_flight_jobs():
+    # $10 spent over 5 jobs: $2 per job
+    budget = _budget(21, hours_elapsed=10 / 3600, completed=5)
+    assert budget.admit(in_flight=4)
+    assert not budget.admit(in_flight=5)
+
+
+def test_report_rows_split_cost_by_job_time():
+    plan = plan_sweep(["a", "b"], [""], [0], images_per_cell=2)
+    stats = new_stats(plan)
+    a, b = stats[Cell("a", "", 0)], stats[Cell("b", "", 0)]
+    a.run, a.images, a.job_seconds, a.first_start, a.last_end = 2, 2, 30.0, 0.0, 60.0
+    b.run, b.failures, b.job_seconds = 1, 1, 10.0
+    budget = _budget(None, hours_elapsed=40 / 3600)
+
+    rows = report_rows(stats, budget)
+    assert [row["not_run"] for row in rows] == [0, 1]
+    assert rows[0]["images_per_minute"] == 2.0
+    assert rows[0]["cost"] == pytest.approx(30, rel=0.01)
+    assert rows[1]["cost_per_image"] is None
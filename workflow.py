@@ -1,18 +1,89 @@
-from langgraph.graph import StateGraph
+from langgraph.constants import Send
+from langgraph.graph import END, START, StateGraph
 
-from agent.nodes import prompt_generator
-from agent.state import OutputState, State
+from admission import scheduler
+from agent.nodes import (
+    generate,
+    prompt_generator,
+    quality_gate,
+    save,
+    start_image,
+    upscale,
+)
+from agent.state import BatchState, OutputState, State
 
 
-def get_workflow():
-    # Define a new graph
+def _continue_to(node):
+    """Route to `node`, or stop the image early if a previous node failed."""
+
+    def route(state):
+        return END if state.get("error") else node
+
+    return route
+
+
+def _after_quality_gate(state):
+    """Upscale images that passed, regenerate the ones that did not."""
+    if state.get("error"):
+        return END
+    return "upscale" if state["quality_passed"] else "generate"
+
+
+def get_image_workflow():
+    """Graph taking a single image from prompt to saved file."""
     workflow = StateGraph(State, output=OutputState)
 
-    # Define the two nodes we will cycle between
+    workflow.add_node("start_image", start_image)
     workflow.add_node("prompt_generator", prompt_generator)
+    workflow.add_node("generate", generate)
+    workflow.add_node("quality_gate", quality_gate)
+    workflow.add_node("upscale", upscale)
+    workflow.add_node("save", save)
     # workflow.add_node("action", tool_node)
 
-    workflow.set_entry_point("prompt_generator")
-    workflow.set_finish_point("prompt_generator")
+    workflow.set_entry_point("start_image")
+    workflow.add_edge("start_image", "prompt_generator")
+    for node, next_node in [
+        ("prompt_generator", "generate"),
+        ("generate", "quality_gate"),
+        ("upscale", "save"),
+    ]:
+        workflow.add_conditional_edges(node, _continue_to(next_node), [next_node, END])
+    workflow.add_conditional_edges(
+        "quality_gate", _after_quality_gate, ["upscale", "generate", END]
+    )
+    workflow.set_finish_point("save")
+
+    return workflow.compile(debug=False)
+
+
+def _fan_out(state):
+    """Send every image of the batch through the image workflow."""
+    item = {
+        "guide": state["guide"],
+        "theme": state["theme"],
+        "instructions": state["instructions"],
+        "request": state["request"],
+        "upscale_factor": state.get("upscale_factor", 0),
+        "batch_deadline": state.get("deadline"),
+    }
+    return [Send("image_pipeline", dict(item)) for _ in range(state["batch_size"])]
+
+
+def get_workflow():
+    # Define a new graph
+    workflow = StateGraph(BatchState, output=OutputState)
+
+    image_workflow = get_image_workflow()
+
+    async def image_pipeline(state, config):
+        # Hold memory for the image's estimated peak while it is in flight
+        async with scheduler.admit(state.get("upscale_factor", 0)):
+            return await image_workflow.ainvoke(state, config)
+
+    # One image_pipeline task per image, all within a single invocation
+    workflow.add_node("image_pipeline", image_pipeline)
+    workflow.add_conditional_edges(START, _fan_out, ["image_pipeline"])
+    workflow.add_edge("image_pipeline", END)
 
     return workflow.compile(debug=False)